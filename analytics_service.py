@@ -0,0 +1,396 @@
+"""
+Long-running local analytics service.
+
+Loads and processes field_df/weather_df once, keeps them in memory and answers
+queries over HTTP. Results are held in an LRU cache keyed by the query parameters,
+which is invalidated whenever the source database file changes on disk.
+"""
+
+import os
+import json
+import time
+import inspect
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+from config import config_params
+from field_data_processor import FieldDataProcessor
+from weather_data_processor import WeatherDataProcessor
+from data_analysis import violin_plots, count_plots, scatter_plots, run_ttest
+from helper_functions import filter_weather_data
+
+# Plot function and the modes it supports for each figure kind
+PLOT_FUNCTIONS = {
+    "violin": (violin_plots, ("U", "B", "M")),
+    "count": (count_plots, ("U", "B")),
+    "scatter": (scatter_plots, ("B", "M")),
+}
+
+
+class InvalidQueryError(ValueError):
+    """
+    Raised when a query has missing, unexpected or invalid parameters.
+    """
+
+
+class DataUnavailableError(RuntimeError):
+    """
+    Raised when no data has been loaded successfully yet.
+    """
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache for query results.
+    """
+
+    def __init__(self, max_size=128):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {"size": len(self.entries), "max_size": self.max_size,
+                    "hits": self.hits, "misses": self.misses}
+
+
+class DataSnapshot:
+    """
+    Processed frames from one load of the source data.
+
+    A snapshot is never modified after creation, so a query that holds one sees
+    a consistent field_df/weather_df pair even while a reload is in progress.
+    """
+
+    def __init__(self, field_df, weather_df, station_means_df, signature, generation):
+        self.field_df = field_df
+        self.weather_df = weather_df
+        self.station_means_df = station_means_df
+        self.signature = signature
+        self.generation = generation
+
+
+class AnalyticsService:
+
+    def __init__(self, config_params, cache_size=128, retry_interval=60, logging_level="INFO"):
+        self.config_params = config_params
+        self.db_file = self.db_file_path(config_params['db_path'])
+        self.cache = ResultCache(cache_size)
+        self.retry_interval = retry_interval
+        self.reload_lock = threading.Lock()
+        self.reload_thread = None
+        self.snapshot = None
+        self.weather_data = None
+        self.failed_signature = None
+        self.failed_at = None
+        self.queries = {
+            "yield_stats": self.yield_stats,
+            "station_means": self.station_means,
+            "ttest": self.ttest,
+            "figure": self.figure,
+        }
+        self.initialize_logging(logging_level)
+
+    def initialize_logging(self, logging_level):
+        logger_name = __name__ + ".AnalyticsService"
+        self.logger = logging.getLogger(logger_name)
+        self.logger.propagate = False  # Prevents log messages from being propagated to the root logger
+
+        # Set logging level
+        if logging_level.upper() == "DEBUG":
+            log_level = logging.DEBUG
+        elif logging_level.upper() == "INFO":
+            log_level = logging.INFO
+        elif logging_level.upper() == "NONE":  # Option to disable logging
+            self.logger.disabled = True
+            return
+        else:
+            log_level = logging.INFO  # Default to INFO
+
+        self.logger.setLevel(log_level)
+
+        # Only add handler if not already added to avoid duplicate messages
+        if not self.logger.handlers:
+            ch = logging.StreamHandler()  # Create console handler
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+            ch.setFormatter(formatter)
+            self.logger.addHandler(ch)
+
+    @staticmethod
+    def db_file_path(db_path):
+        # Strip the SQLAlchemy dialect prefix, e.g. 'sqlite:///file.db' -> 'file.db'
+        prefix = "sqlite:///"
+        return db_path[len(prefix):] if db_path.startswith(prefix) else None
+
+    def read_source_signature(self):
+        if self.db_file is None or not os.path.exists(self.db_file):
+            return None
+        stat = os.stat(self.db_file)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def load_weather_data(self):
+        weather_processor = WeatherDataProcessor(self.config_params)
+        weather_processor.process()
+        return weather_processor.weather_df, weather_processor.calculate_means()
+
+    def load_field_data(self):
+        field_processor = FieldDataProcessor(self.config_params)
+        field_processor.process()
+        # Rename 'Ave_temps' in field_df to 'Temperature' to match weather_df
+        return field_processor.df.rename(columns={'Ave_temps': 'Temperature'})
+
+    def load_data(self, signature, generation):
+        # Weather data doesn't come from the database, so it is only loaded once
+        if self.weather_data is None:
+            self.weather_data = self.load_weather_data()
+        weather_df, station_means_df = self.weather_data
+        return DataSnapshot(self.load_field_data(), weather_df, station_means_df, signature, generation)
+
+    def is_current(self, signature):
+        if self.snapshot is not None and signature == self.snapshot.signature:
+            return True
+        # Don't retry a signature that failed to load until the retry interval has passed
+        return (self.failed_at is not None and signature == self.failed_signature
+                and time.monotonic() - self.failed_at < self.retry_interval)
+
+    def refresh_if_changed(self):
+        """
+        Reload the data if the source database has changed since the last load.
+
+        The initial load blocks. Later reloads run in a background thread while the
+        current snapshot keeps being served. If a reload fails, the failed source is
+        not retried until retry_interval seconds have passed.
+
+        Returns:
+            DataSnapshot: The snapshot queries should be answered from.
+
+        Raises:
+            DataUnavailableError: If no data has been loaded successfully yet.
+        """
+        signature = self.read_source_signature()
+        snapshot = self.snapshot
+        if snapshot is None:
+            with self.reload_lock:
+                # Another thread may have loaded the data while we waited for the lock
+                if self.snapshot is None and not self.is_current(signature):
+                    self.reload(signature)
+            snapshot = self.snapshot
+            if snapshot is None:
+                raise DataUnavailableError("Data is not available, the initial load failed.")
+        elif not self.is_current(signature) and self.reload_lock.acquire(blocking=False):
+            # The reload thread releases the lock when it finishes
+            self.reload_thread = threading.Thread(target=self.background_reload, args=(signature,), daemon=True)
+            self.reload_thread.start()
+        return snapshot
+
+    def background_reload(self, signature):
+        try:
+            if not self.is_current(signature):
+                self.reload(signature)
+        finally:
+            self.reload_lock.release()
+
+    def reload(self, signature):
+        generation = self.snapshot.generation + 1 if self.snapshot is not None else 0
+        if self.snapshot is not None:
+            self.logger.info(f"Source database {self.db_file} changed, reloading data.")
+        try:
+            snapshot = self.load_data(signature, generation)
+        except Exception as e:
+            self.failed_signature, self.failed_at = signature, time.monotonic()
+            self.logger.error(f"Failed to load data, retrying in {self.retry_interval}s. Error: {e}")
+            return
+        self.snapshot = snapshot
+        self.failed_signature = self.failed_at = None
+        self.cache.clear()
+        self.logger.info(f"Datasets loaded into memory (generation {generation}).")
+
+    def query(self, name, params):
+        """
+        Run a named query, serving the encoded result from the cache when possible.
+
+        Args:
+            name (str): Query name, one of the keys of self.queries.
+            params (dict): Query parameters as strings.
+
+        Returns:
+            bytes: JSON-encoded query result.
+
+        Raises:
+            KeyError: If the query name is unknown.
+            InvalidQueryError: If the query parameters are missing, unexpected or invalid.
+            DataUnavailableError: If no data has been loaded yet.
+        """
+        handler = self.queries[name]
+        try:
+            inspect.signature(handler).bind(None, **params)
+        except TypeError as e:
+            raise InvalidQueryError(str(e))
+        data = self.refresh_if_changed()
+        # The generation in the key stops a result computed from an older snapshot being served later
+        key = (data.generation, name, tuple(sorted(params.items())))
+        payload = self.cache.get(key)
+        if payload is None:
+            result = handler(data, **params)
+            payload = (result if isinstance(result, str) else json.dumps(result)).encode("utf-8")
+            if self.snapshot is data:
+                self.cache.put(key, payload)
+        return payload
+
+    def yield_stats(self, data, crop_type=None, location=None):
+        df = data.field_df
+        if crop_type is not None:
+            df = df[df['Crop_type'] == crop_type]
+        if location is not None:
+            df = df[df['Location'] == location]
+        stats = df['Annual_yield'].describe()
+        return {"crop_type": crop_type, "location": location,
+                "stats": to_json_safe(stats.to_dict())}
+
+    def station_means(self, data, station_id=None):
+        means = data.station_means_df
+        if station_id is not None:
+            station_id = parse_number(station_id, "station_id", int)
+            if station_id not in means.index:
+                raise InvalidQueryError(f"Unknown station: {station_id}")
+            means = means.loc[[station_id]]
+        return {str(station): to_json_safe(row.to_dict()) for station, row in means.iterrows()}
+
+    def ttest(self, data, station_id, measurement, alpha="0.05"):
+        station_id = parse_number(station_id, "station_id", int)
+        alpha = parse_number(alpha, "alpha", float)
+        if measurement not in self.config_params['regex_patterns']:
+            raise InvalidQueryError(f"Unknown measurement: {measurement}")
+        field_data = data.field_df[data.field_df['Weather_station'] == station_id][measurement]
+        weather_data = filter_weather_data(data.weather_df, station_id, measurement)
+        if field_data.empty or weather_data.empty:
+            raise InvalidQueryError(f"No {measurement} data for station {station_id}")
+        t_stat, p_val = run_ttest(field_data, weather_data)
+        return to_json_safe({"station_id": station_id, "measurement": measurement,
+                             "t_statistic": float(t_stat), "p_value": float(p_val),
+                             "alpha": alpha, "significant": bool(p_val < alpha)})
+
+    def figure(self, data, kind, mode, x, y="", z=""):
+        if kind not in PLOT_FUNCTIONS:
+            raise InvalidQueryError(f"Unknown figure kind: {kind}")
+        plot_function, modes = PLOT_FUNCTIONS[kind]
+        if mode not in modes:
+            raise InvalidQueryError(f"Unsupported mode {mode} for {kind} plots, expected one of {', '.join(modes)}")
+        # Univariate plots use x, bivariate x and y, multivariate x, y and z
+        columns = {"U": [x], "B": [x, y], "M": [x, y, z]}[mode]
+        for column in columns:
+            if column not in data.field_df.columns:
+                raise InvalidQueryError(f"Unknown column: {column}")
+        fig = plot_function(data.field_df, mode, x, y, z)
+        return fig.to_json()
+
+
+def parse_number(value, name, cast):
+    try:
+        return cast(value)
+    except ValueError:
+        raise InvalidQueryError(f"Invalid {name}: {value}")
+
+
+def to_json_safe(value):
+    """
+    Recursively convert NaN and numpy scalars into JSON-friendly Python values.
+    """
+    if isinstance(value, dict):
+        return {str(k): to_json_safe(v) for k, v in value.items()}
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+def make_handler(service):
+
+    class AnalyticsRequestHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            name = url.path.strip("/")
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            if name == "health":
+                return self.send_json(200, {"status": "ok", "cache": service.cache.stats()})
+            if name not in service.queries:
+                return self.send_json(404, {"error": f"Unknown query: {name}"})
+            try:
+                payload = service.query(name, params)
+            except InvalidQueryError as e:
+                return self.send_json(400, {"error": str(e)})
+            except DataUnavailableError as e:
+                return self.send_json(503, {"error": str(e)})
+            except Exception:
+                service.logger.exception(f"Query {name} failed.")
+                return self.send_json(500, {"error": f"Query {name} failed."})
+            self.send_payload(200, payload)
+
+        def send_json(self, status, body):
+            self.send_payload(status, json.dumps(body).encode("utf-8"))
+
+        def send_payload(self, status, payload):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            service.logger.debug(format % args)
+
+    return AnalyticsRequestHandler
+
+
+def serve(host="127.0.0.1", port=8000, cache_size=128, retry_interval=60, logging_level="INFO"):
+    service = AnalyticsService(config_params, cache_size, retry_interval, logging_level)
+    service.refresh_if_changed()
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    service.logger.info(f"Analytics service listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve Maji Ndogo analytics queries from memory.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--cache-size", type=int, default=128)
+    parser.add_argument("--retry-interval", type=int, default=60,
+                        help="Seconds to wait before retrying a failed data reload.")
+    parser.add_argument("--logging-level", default="INFO")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.cache_size, args.retry_interval, args.logging_level)
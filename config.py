@@ -0,0 +1,21 @@
+patterns = {
+    'Rainfall': r'(\d+(\.\d+)?)\s?mm',
+    'Temperature': r'(\d+(\.\d+)?)\s?C',
+    'Pollution_level': r'=\s*(-?\d+(\.\d+)?)|Pollution at \s*(-?\d+(\.\d+)?)'
+}
+
+config_params = {
+    "sql_query": """
+            SELECT *
+            FROM geographic_features
+            LEFT JOIN weather_features USING (Field_ID)
+            LEFT JOIN soil_and_crop_features USING (Field_ID)
+            LEFT JOIN farm_management_features USING (Field_ID)
+            """,
+    "db_path": 'sqlite:///Maji_Ndogo_farm_survey_small.db', 
+    "columns_to_rename": {'Annual_yield': 'Crop_type', 'Crop_type': 'Annual_yield'},
+    "values_to_rename": {'cassaval': 'cassava', 'wheatn': 'wheat', 'teaa': 'tea', 'tea ': 'tea', 'wheat ': 'wheat', 'cassava ': 'cassava'}, 
+    "weather_mapping_csv":"https://raw.githubusercontent.com/Explore-AI/Public-Data/master/Maji_Ndogo/Weather_data_field_mapping.csv",
+    "weather_csv_path": "https://raw.githubusercontent.com/Explore-AI/Public-Data/master/Maji_Ndogo/Weather_station_data.csv",
+    "regex_patterns" : patterns
+}
@@ -10,7 +10,7 @@ def filter_field_data(df, column: str, filter: str):
     return df[(df[column] == filter)]
 
 def filter_weather_data(df, station_id, measurement):
-    return df[(df['Weather_station_ID'] == station_id) & (df['Measurement'] == 'Temperature')]['Value']
+    return df[(df['Weather_station_ID'] == station_id) & (df['Measurement'] == measurement)]['Value']
 
 def create_subplots(unique_groups: list, groups: str, n_rows: int, n_cols: int=2):    
     fig = make_subplots(
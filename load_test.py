@@ -0,0 +1,95 @@
+"""
+Load test for analytics_service.py.
+
+Replays a mix of queries against a running service and reports latency percentiles.
+The first pass over QUERIES is timed on its own as the cold (cache-miss) run, the
+remaining requests are reported as the warm run.
+"""
+
+import json
+import time
+import argparse
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import urlopen
+import numpy as np
+
+QUERIES = [
+    "/yield_stats",
+    "/yield_stats?crop_type=Tea",
+    "/yield_stats?crop_type=Cassava&location=Rural%20Akatsi",
+    "/station_means",
+    "/station_means?station_id=0",
+    "/ttest?station_id=0&measurement=Temperature",
+    "/ttest?station_id=1&measurement=Rainfall",
+    "/figure?kind=violin&mode=B&x=Crop_type&y=Annual_yield",
+    "/figure?kind=scatter&mode=M&x=Rainfall&y=Annual_yield&z=Crop_type",
+]
+
+
+def timed_request(url, timeout=30):
+    start = time.perf_counter()
+    try:
+        with urlopen(url, timeout=timeout) as response:
+            response.read()
+            ok = True
+    except OSError:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def cache_misses(base_url, timeout=30):
+    try:
+        with urlopen(base_url + "/health", timeout=timeout) as response:
+            return json.load(response)["cache"]["misses"]
+    except OSError:
+        return None
+
+
+def print_latencies(label, results, elapsed):
+    latencies_ms = np.array([latency for latency, ok in results if ok]) * 1000
+    errors = len(results) - len(latencies_ms)
+    print(f"{label}: {len(results)} requests  Errors: {errors}  Throughput: {len(results) / elapsed:.1f} req/s")
+    # Failed requests are excluded so they don't skew the percentiles
+    if len(latencies_ms) == 0:
+        print("   No successful requests.")
+        return
+    print(f"   Latency (ms): mean {latencies_ms.mean():.2f}  max {latencies_ms.max():.2f}")
+    for p in (50, 90, 95, 99):
+        print(f"   p{p}: {np.percentile(latencies_ms, p):.2f}")
+
+
+def run_load_test(base_url, n_requests=1000, concurrency=8, timeout=30):
+    base_url = base_url.rstrip("/")
+
+    # Cold run: each query once, sequentially, so every request is a cache miss on a fresh service
+    misses_before = cache_misses(base_url, timeout)
+    if misses_before is None:
+        print(f"Service not reachable at {base_url}")
+        return
+    start = time.perf_counter()
+    cold_results = [timed_request(base_url + path, timeout) for path in QUERIES]
+    cold_elapsed = time.perf_counter() - start
+    misses_after = cache_misses(base_url, timeout)
+    print_latencies("Cold", cold_results, cold_elapsed)
+    if misses_after is not None and misses_after - misses_before < len(QUERIES):
+        cold_misses = misses_after - misses_before
+        print(f"   Only {cold_misses} of {len(QUERIES)} cold requests missed the cache, restart the service for a true cold run.")
+
+    # Warm run: the same queries again, now served from the cache
+    urls = [base_url + path for path in itertools.islice(itertools.cycle(QUERIES), n_requests)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        warm_results = list(executor.map(lambda url: timed_request(url, timeout), urls))
+    warm_elapsed = time.perf_counter() - start
+    print_latencies(f"Warm (concurrency {concurrency})", warm_results, warm_elapsed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report latency percentiles for the analytics service.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=30, help="Per-request timeout in seconds.")
+    args = parser.parse_args()
+    run_load_test(args.url, args.requests, args.concurrency, args.timeout)
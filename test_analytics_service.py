@@ -0,0 +1,202 @@
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.request import urlopen
+import pandas as pd
+import pytest
+from analytics_service import AnalyticsService, ResultCache, InvalidQueryError, DataUnavailableError, make_handler
+
+
+class StubService(AnalyticsService):
+    """
+    AnalyticsService with the processors replaced by small in-memory frames.
+    """
+
+    def __init__(self, config_params, **kwargs):
+        super().__init__(config_params, logging_level="NONE", **kwargs)
+        self.field_loads = 0
+        self.weather_loads = 0
+        self.fail = False
+        self.release = threading.Event()
+        self.release.set()
+
+    def load_weather_data(self):
+        self.weather_loads += 1
+        weather_df = pd.DataFrame({
+            "Weather_station_ID": [0, 0, 0, 1, 1, 1],
+            "Measurement": ["Rainfall"] * 6,
+            "Value": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+        })
+        means = weather_df.groupby(by=["Weather_station_ID", "Measurement"])["Value"].mean().unstack()
+        return weather_df, means
+
+    def load_field_data(self):
+        self.release.wait()
+        if self.fail:
+            raise OSError("database is locked")
+        self.field_loads += 1
+        return pd.DataFrame({
+            "Weather_station": [0, 0, 0, 1, 1, 1],
+            "Rainfall": [1.5, 2.5, 3.5, 4.5, 5.5, 6.5],
+            "Crop_type": ["Tea", "Tea", "Cassava", "Tea", "Cassava", "Cassava"],
+            "Location": ["Rural Akatsi"] * 6,
+            "Annual_yield": [float(self.field_loads)] * 6,
+        })
+
+
+def change_db(db_file):
+    # Append a byte so the size changes even if the mtime resolution is coarse
+    with open(db_file, "ab") as f:
+        f.write(b"\0")
+
+
+def wait_for_reload(service):
+    if service.reload_thread is not None:
+        service.reload_thread.join(timeout=5)
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    path = tmp_path / "farm.db"
+    path.write_bytes(b"\0")
+    return str(path)
+
+
+@pytest.fixture
+def service(db_file):
+    service = StubService({"db_path": f"sqlite:///{db_file}", "regex_patterns": {"Rainfall": ""}})
+    service.refresh_if_changed()
+    return service
+
+
+def query_json(service, name, params):
+    return json.loads(service.query(name, params))
+
+
+def test_result_cache_evicts_least_recently_used():
+    cache = ResultCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_query_is_cached_until_db_changes(service, db_file):
+    assert query_json(service, "yield_stats", {})["stats"]["mean"] == 1.0
+    query_json(service, "yield_stats", {})
+    assert service.cache.stats()["hits"] == 1
+
+    change_db(db_file)
+    # The reload runs in the background, the old snapshot is answered meanwhile
+    service.refresh_if_changed()
+    wait_for_reload(service)
+    assert service.snapshot.generation == 1
+    assert query_json(service, "yield_stats", {})["stats"]["mean"] == 2.0
+    assert service.weather_loads == 1
+
+
+def test_stale_result_is_not_cached_after_reload(service, db_file):
+    yield_stats = service.yield_stats
+
+    def reload_during_query(data, **params):
+        # Another thread swaps in a new snapshot while this query is computing
+        change_db(db_file)
+        service.reload(service.read_source_signature())
+        return yield_stats(data, **params)
+
+    service.queries["yield_stats"] = reload_during_query
+    assert query_json(service, "yield_stats", {})["stats"]["mean"] == 1.0
+    assert service.cache.stats()["size"] == 0
+
+    service.queries["yield_stats"] = yield_stats
+    assert query_json(service, "yield_stats", {})["stats"]["mean"] == 2.0
+
+
+def test_reload_does_not_block_queries(service, db_file):
+    service.release.clear()
+    change_db(db_file)
+    start = time.monotonic()
+    assert query_json(service, "yield_stats", {})["stats"]["mean"] == 1.0
+    assert query_json(service, "yield_stats", {"crop_type": "Tea"})["stats"]["mean"] == 1.0
+    assert time.monotonic() - start < 1
+    service.release.set()
+    wait_for_reload(service)
+    assert query_json(service, "yield_stats", {})["stats"]["mean"] == 2.0
+
+
+def test_failed_reload_keeps_last_snapshot_and_backs_off(service, db_file):
+    service.fail = True
+    change_db(db_file)
+    service.refresh_if_changed()
+    wait_for_reload(service)
+    assert service.snapshot.generation == 0
+    assert query_json(service, "yield_stats", {})["stats"]["mean"] == 1.0
+
+    # The failed source is not retried within the retry interval
+    service.reload_thread = None
+    service.refresh_if_changed()
+    assert service.reload_thread is None
+
+    service.fail = False
+    service.failed_at -= service.retry_interval
+    service.refresh_if_changed()
+    wait_for_reload(service)
+    assert service.snapshot.generation == 1
+
+
+def test_initial_load_failure_raises_data_unavailable(db_file):
+    service = StubService({"db_path": f"sqlite:///{db_file}", "regex_patterns": {}})
+    service.fail = True
+    with pytest.raises(DataUnavailableError):
+        service.refresh_if_changed()
+    assert service.failed_signature is not None
+
+
+@pytest.mark.parametrize("name, params", [
+    ("yield_stats", {"unknown": "1"}),
+    ("station_means", {"station_id": "99"}),
+    ("station_means", {"station_id": "abc"}),
+    ("ttest", {"station_id": "99", "measurement": "Rainfall"}),
+    ("ttest", {"station_id": "0", "measurement": "Humidity"}),
+    ("figure", {"kind": "count", "mode": "M", "x": "Crop_type"}),
+    ("figure", {"kind": "scatter", "mode": "B", "x": "Rainfall", "y": "Missing"}),
+])
+def test_invalid_queries_raise(service, name, params):
+    with pytest.raises(InvalidQueryError):
+        service.query(name, params)
+
+
+@pytest.fixture
+def server(service):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(service))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def get_status(url):
+    try:
+        with urlopen(url, timeout=5) as response:
+            return response.status
+    except HTTPError as e:
+        return e.code
+
+
+def test_http_status_mapping(service, server):
+    assert get_status(f"{server}/yield_stats?crop_type=Tea") == 200
+    assert get_status(f"{server}/ttest?station_id=0&measurement=Rainfall") == 200
+    assert get_status(f"{server}/figure?kind=violin&mode=B&x=Crop_type&y=Annual_yield") == 200
+    assert get_status(f"{server}/unknown") == 404
+    assert get_status(f"{server}/station_means?station_id=99") == 400
+    assert get_status(f"{server}/figure?kind=count&mode=M&x=Crop_type") == 400
+
+    service.snapshot = None
+    service.fail = True
+    assert get_status(f"{server}/yield_stats") == 503